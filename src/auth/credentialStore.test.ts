@@ -0,0 +1,45 @@
+import { describe, it, expect, beforeAll, afterAll } from 'vitest';
+import fs from 'fs/promises';
+import os from 'os';
+import path from 'path';
+import type { CredentialStore as CredentialStoreType } from './credentialStore';
+
+describe('credentialStore', () => {
+  const originalMasterKey = process.env.MASTER_KEY;
+  let CredentialStore: typeof CredentialStoreType;
+  let baseDir: string;
+
+  beforeAll(async () => {
+    process.env.MASTER_KEY = 'a'.repeat(64);
+    ({ CredentialStore } = await import('./credentialStore'));
+    baseDir = await fs.mkdtemp(path.join(os.tmpdir(), 'creds-'));
+  });
+
+  afterAll(async () => {
+    if (originalMasterKey === undefined) {
+      delete process.env.MASTER_KEY;
+    } else {
+      process.env.MASTER_KEY = originalMasterKey;
+    }
+    await fs.rm(baseDir, { recursive: true, force: true });
+  });
+
+  it('should reuse the client until the credential is stored again', async () => {
+    const store = new CredentialStore(baseDir);
+    await store.storeCredential('user@example.com', { access_token: 'first' });
+
+    const first = await store.getCredential('user@example.com');
+    expect(first?.credentials.access_token).toBe('first');
+    expect(await store.getCredential('User@Example.com')).toBe(first);
+
+    await store.storeCredential('user@example.com', { access_token: 'second' });
+    const second = await store.getCredential('user@example.com');
+    expect(second).not.toBe(first);
+    expect(second?.credentials.access_token).toBe('second');
+  });
+
+  it('should return null for unknown users', async () => {
+    const store = new CredentialStore(baseDir);
+    expect(await store.getCredential('missing@example.com')).toBeNull();
+  });
+});
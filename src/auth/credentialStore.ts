@@ -17,6 +17,9 @@ type OAuth2Client = InstanceType<typeof google.auth.OAuth2>;
 
 export class CredentialStore {
     private baseDir: string;
+    // Decrypted clients keyed by email, valid while the credential file's mtime is unchanged.
+    // Reusing the client also keeps refreshed access tokens across tool calls.
+    private clients = new Map<string, { mtimeMs: number; client: OAuth2Client }>();
 
     constructor(baseDir?: string) {
         if (baseDir) {
@@ -50,6 +53,12 @@ export class CredentialStore {
 
         const credsPath = this.getCredentialPath(sanitizedEmail);
         try {
+            const { mtimeMs } = await fs.stat(credsPath);
+            const cached = this.clients.get(sanitizedEmail);
+            if (cached && cached.mtimeMs === mtimeMs) {
+                return cached.client;
+            }
+
             const data = await fs.readFile(credsPath, 'utf8');
             const json = decryptJson(config.MASTER_KEY, data) as StoredCredential;
 
@@ -59,8 +68,10 @@ export class CredentialStore {
             );
 
             client.setCredentials(json);
+            this.clients.set(sanitizedEmail, { mtimeMs, client });
             return client;
         } catch (err) {
+            this.clients.delete(sanitizedEmail);
             return null;
         }
     }
@@ -78,6 +89,7 @@ export class CredentialStore {
         const credsPath = this.getCredentialPath(sanitizedEmail);
         const encrypted = encryptJson(config.MASTER_KEY, credentials);
         await fs.writeFile(credsPath, encrypted);
+        this.clients.delete(sanitizedEmail);
     }
 }
 
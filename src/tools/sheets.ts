@@ -2,9 +2,86 @@ import { McpServer } from "@modelcontextprotocol/sdk/server/mcp.js";
 import { z } from "zod";
 import { google, sheets_v4 } from "googleapis";
 import { credentialStore } from "../auth/credentialStore";
+import { validateEmail } from "../utils/validation";
+import { BackoffOptions, KeyedSemaphore, TokenBucket, withBackoff } from "../utils/rateLimit";
+import { BatchCoalescer } from "../utils/batching";
+import { SheetOp, buildSheetOpRequest, describeSheetOpReply } from "./sheetsHelpers";
 
 // Helper Functions
 
+// Sheets quotas are per-minute and aggressive; bound concurrency per spreadsheet and
+// back off on 429/503 instead of surfacing the first quota error to the caller.
+const spreadsheetSlots = new KeyedSemaphore(15);
+
+function callSheets<T>(spreadsheetId: string, request: () => Promise<T>, backoff: BackoffOptions = {}): Promise<T> {
+    return spreadsheetSlots.run(spreadsheetId, () => withBackoff(request, backoff));
+}
+
+// Sheets allows 60 write requests per minute per user. Queue writes against that budget
+// rather than spending retries on 429s; every attempt of a coalesced batch, retries
+// included, costs a single token.
+const writeBuckets = new Map<string, TokenBucket>();
+
+// Quota belongs to the account, so key per-user state the same way CredentialStore does.
+function userKey(userEmail: string): string {
+    return validateEmail(userEmail) ?? userEmail;
+}
+
+function writeBucketFor(userEmail: string): TokenBucket {
+    const key = userKey(userEmail);
+    let bucket = writeBuckets.get(key);
+    if (!bucket) {
+        bucket = new TokenBucket(60, 60000);
+        writeBuckets.set(key, bucket);
+    }
+    return bucket;
+}
+
+function callSheetsWrite<T>(
+    userEmail: string,
+    spreadsheetId: string,
+    request: () => Promise<T>,
+    backoff: BackoffOptions = {}
+): Promise<T> {
+    const bucket = writeBucketFor(userEmail);
+    // Take the token before a spreadsheet slot so a throttled writer does not hold up reads.
+    return withBackoff(async () => {
+        await bucket.acquire();
+        return spreadsheetSlots.run(spreadsheetId, request);
+    }, backoff);
+}
+
+interface ValueWrite {
+    sheets: sheets_v4.Sheets;
+    userEmail: string;
+    spreadsheetId: string;
+    range: string;
+    values: any[][];
+    valueInputOption: string;
+}
+
+// Concurrent writes to the same spreadsheet (same user and input option) are folded
+// into a single values.batchUpdate; each caller gets back its own per-range response.
+const valueWrites = new BatchCoalescer<ValueWrite, sheets_v4.Schema$UpdateValuesResponse>(
+    async (_key, writes) => {
+        const { sheets, userEmail, spreadsheetId, valueInputOption } = writes[0];
+        const res = await callSheetsWrite(userEmail, spreadsheetId, () => sheets.spreadsheets.values.batchUpdate({
+            spreadsheetId,
+            fields: "responses(updatedRange,updatedCells)",
+            requestBody: {
+                valueInputOption,
+                data: writes.map(w => ({ range: w.range, values: w.values }))
+            }
+        }));
+        const responses = res.data.responses || [];
+        return writes.map((w, i) => {
+            const response = responses[i];
+            if (!response) throw new Error(`No update response returned for range '${w.range}'.`);
+            return response;
+        });
+    }
+);
+
 function parseValues(values: string | any[][]): any[][] {
     if (typeof values === 'string') {
         try {
@@ -37,7 +114,8 @@ export function registerSheetsTools(server: McpServer) {
                 const drive = google.drive({ version: "v3", auth });
                 const res = await drive.files.list({
                     q: "mimeType='application/vnd.google-apps.spreadsheet' and trashed=false",
-                    pageSize: page_size,
+                    // Drive caps pageSize at 1000; clamp so oversized requests don't fail outright.
+                    pageSize: Math.min(page_size, 1000),
                     pageToken: page_token,
                     fields: "nextPageToken, files(id,name,modifiedTime,webViewLink)",
                     orderBy: "modifiedTime desc",
@@ -48,10 +126,10 @@ export function registerSheetsTools(server: McpServer) {
                 const files = res.data.files || [];
                 if (files.length === 0) return { content: [{ type: "text", text: `No spreadsheets found.` }] };
 
-                let output = `Successfully listed ${files.length} spreadsheets for ${user_google_email}:\n`;
-                files.forEach(f => {
-                    output += `- "${f.name}" (ID: ${f.id}) | Modified: ${f.modifiedTime} | Link: ${f.webViewLink}\n`;
-                });
+                const lines = files.map(f =>
+                    `- "${f.name}" (ID: ${f.id}) | Modified: ${f.modifiedTime ?? "Unknown"} | Link: ${f.webViewLink ?? "No link"}`
+                );
+                let output = `Successfully listed ${files.length} spreadsheets for ${user_google_email}:\n${lines.join("\n")}\n`;
 
                 if (res.data.nextPageToken) output += `\nNext page token: ${res.data.nextPageToken}`;
                 return { content: [{ type: "text", text: output }] };
@@ -75,18 +153,18 @@ export function registerSheetsTools(server: McpServer) {
 
             try {
                 const sheets = google.sheets({ version: "v4", auth });
-                const res = await sheets.spreadsheets.get({
+                const res = await callSheets(spreadsheet_id, () => sheets.spreadsheets.get({
                     spreadsheetId: spreadsheet_id,
                     fields: "spreadsheetId,properties(title,locale),sheets(properties(title,sheetId,gridProperties(rowCount,columnCount)))"
-                });
+                }));
 
                 const spr = res.data;
-                let output = `Spreadsheet: "${spr.properties?.title}" (ID: ${spr.spreadsheetId}) | Locale: ${spr.properties?.locale}\nSheets:\n`;
-
-                spr.sheets?.forEach(sheet => {
-                    const props = sheet.properties;
-                    output += `  - "${props?.title}" (ID: ${props?.sheetId}) | Size: ${props?.gridProperties?.rowCount}x${props?.gridProperties?.columnCount}\n`;
+                const sheetLines = (spr.sheets || []).map(sheet => {
+                    const props: sheets_v4.Schema$SheetProperties = sheet.properties || {};
+                    const grid = props.gridProperties || {};
+                    return `  - "${props.title || `Sheet ${props.sheetId}`}" (ID: ${props.sheetId}) | Size: ${grid.rowCount}x${grid.columnCount}\n`;
                 });
+                const output = `Spreadsheet: "${spr.properties?.title}" (ID: ${spr.spreadsheetId}) | Locale: ${spr.properties?.locale}\nSheets:\n${sheetLines.join("")}`;
 
                 return { content: [{ type: "text", text: output }] };
 
@@ -110,20 +188,21 @@ export function registerSheetsTools(server: McpServer) {
 
             try {
                 const sheets = google.sheets({ version: "v4", auth });
-                const res = await sheets.spreadsheets.values.get({
+                const res = await callSheets(spreadsheet_id, () => sheets.spreadsheets.values.get({
                     spreadsheetId: spreadsheet_id,
                     range: range_name
-                });
+                }));
 
                 const values = res.data.values || [];
                 if (values.length === 0) return { content: [{ type: "text", text: `No data found in range '${range_name}'.` }] };
 
                 let output = `Successfully read ${values.length} rows from range '${range_name}':\n`;
-                // Limit output to avoid token limits
+                // Limit output to avoid token limits; only the shown rows are ever formatted
                 const limit = 50;
-                values.slice(0, limit).forEach((row, i) => {
-                    output += `Row ${i + 1}: ${JSON.stringify(row)}\n`;
-                });
+                const shown = Math.min(values.length, limit);
+                for (let i = 0; i < shown; i++) {
+                    output += `Row ${i + 1}: ${JSON.stringify(values[i])}\n`;
+                }
                 if (values.length > limit) output += `\n... and ${values.length - limit} more rows.`;
 
                 return { content: [{ type: "text", text: output }] };
@@ -145,36 +224,116 @@ export function registerSheetsTools(server: McpServer) {
             clear_values: z.boolean().default(false)
         },
         async ({ user_google_email, spreadsheet_id, range_name, values, value_input_option, clear_values }) => {
-            const auth = await credentialStore.getCredential(user_google_email);
-            if (!auth) return { content: [{ type: "text", text: `Authorization required` }], isError: true };
-
             if (!clear_values && !values) {
                 return { content: [{ type: "text", text: `Either 'values' must be provided or 'clear_values' must be True.` }], isError: true };
             }
 
+            const auth = await credentialStore.getCredential(user_google_email);
+            if (!auth) return { content: [{ type: "text", text: `Authorization required` }], isError: true };
+
             try {
                 const sheets = google.sheets({ version: "v4", auth });
 
                 if (clear_values) {
-                    const res = await sheets.spreadsheets.values.clear({
+                    const res = await callSheetsWrite(user_google_email, spreadsheet_id, () => sheets.spreadsheets.values.clear({
                         spreadsheetId: spreadsheet_id,
-                        range: range_name
-                    });
+                        range: range_name,
+                        fields: "clearedRange"
+                    }));
                     return { content: [{ type: "text", text: `Successfully cleared range '${res.data.clearedRange || range_name}'.` }] };
                 } else {
                     const parsedValues = parseValues(values!);
-                    const res = await sheets.spreadsheets.values.update({
+                    const res = await valueWrites.submit(`${userKey(user_google_email)}:${spreadsheet_id}:${value_input_option}`, {
+                        sheets,
+                        userEmail: user_google_email,
                         spreadsheetId: spreadsheet_id,
                         range: range_name,
-                        valueInputOption: value_input_option,
-                        requestBody: { values: parsedValues }
+                        values: parsedValues,
+                        valueInputOption: value_input_option
                     });
 
-                    return { content: [{ type: "text", text: `Successfully updated range '${res.data.updatedRange}'. Updated ${res.data.updatedCells} cells.` }] };
+                    return { content: [{ type: "text", text: `Successfully updated range '${res.updatedRange}'. Updated ${res.updatedCells} cells.` }] };
                 }
             } catch (err: any) {
                 return { content: [{ type: "text", text: `Error modifying values: ${err.message}` }], isError: true };
             }
         }
     );
+
+    server.tool(
+        "bulk_apply_sheet_ops",
+        "Applies several structural operations (add sheet, named range, data validation, protected range) to a spreadsheet in a single batchUpdate.",
+        {
+            user_google_email: z.string(),
+            spreadsheet_id: z.string(),
+            operations: z.array(z.discriminatedUnion("op", [
+                z.object({
+                    op: z.literal("addSheet"),
+                    title: z.string(),
+                    rows: z.number().optional(),
+                    columns: z.number().optional()
+                }),
+                z.object({
+                    op: z.literal("addNamedRange"),
+                    name: z.string(),
+                    range: z.string().describe("A1 range, e.g. 'Sheet1!A1:B10'.")
+                }),
+                z.object({
+                    op: z.literal("addDataValidation"),
+                    range: z.string(),
+                    condition_type: z.string().describe("Sheets ConditionType, e.g. 'ONE_OF_LIST' or 'NUMBER_GREATER'."),
+                    values: z.array(z.string()).optional(),
+                    strict: z.boolean().optional(),
+                    input_message: z.string().optional()
+                }),
+                z.object({
+                    op: z.literal("addProtectedRange"),
+                    range: z.string(),
+                    description: z.string().optional(),
+                    warning_only: z.boolean().optional(),
+                    editors: z.array(z.string()).optional()
+                })
+            ])).min(1).describe("Operations to apply, in order. Ranges may target sheets added earlier in the same call.")
+        },
+        async ({ user_google_email, spreadsheet_id, operations }) => {
+            const auth = await credentialStore.getCredential(user_google_email);
+            if (!auth) return { content: [{ type: "text", text: `Authorization required` }], isError: true };
+
+            try {
+                const sheets = google.sheets({ version: "v4", auth });
+                const ops = operations as SheetOp[];
+
+                // Resolve A1 ranges locally; only fetch sheet metadata if some operation needs it.
+                const sheetIds = new Map<string, number>();
+                let defaultSheetId: number | undefined;
+                if (ops.some(op => op.op !== "addSheet")) {
+                    const meta = await callSheets(spreadsheet_id, () => sheets.spreadsheets.get({
+                        spreadsheetId: spreadsheet_id,
+                        fields: "sheets(properties(sheetId,title))"
+                    }));
+                    for (const sheet of meta.data.sheets || []) {
+                        const props = sheet.properties;
+                        if (props?.title != null && props.sheetId != null) sheetIds.set(props.title, props.sheetId);
+                    }
+                    defaultSheetId = meta.data.sheets?.[0]?.properties?.sheetId ?? undefined;
+                }
+
+                const requests = ops.map(op => buildSheetOpRequest(op, sheetIds, defaultSheetId));
+                // Structural requests are not idempotent: a 503 may arrive after the batch was
+                // committed, so only retry 429s, which are rejected before anything is applied.
+                const res = await callSheetsWrite(user_google_email, spreadsheet_id, () => sheets.spreadsheets.batchUpdate({
+                    spreadsheetId: spreadsheet_id,
+                    // Only the IDs reported back to the caller are needed from the replies.
+                    fields: "replies(addSheet/properties/sheetId,addNamedRange/namedRange/namedRangeId,addProtectedRange/protectedRange/protectedRangeId)",
+                    requestBody: { requests }
+                }), { retryStatuses: [429] });
+
+                const replies = res.data.replies || [];
+                const lines = ops.map((op, i) => `- ${describeSheetOpReply(op, replies[i])}`);
+                return { content: [{ type: "text", text: `Applied ${ops.length} operations to spreadsheet ${spreadsheet_id}:\n${lines.join("\n")}` }] };
+            } catch (err: any) {
+                return { content: [{ type: "text", text: `Error applying sheet operations: ${err.message}` }], isError: true };
+            }
+        }
+    );
 }
@@ -0,0 +1,62 @@
+import { describe, it, expect } from 'vitest';
+import { columnToIndex, parseA1Range, buildSheetOpRequest } from './sheetsHelpers';
+
+describe('sheetsHelpers', () => {
+  const sheetIds = () => new Map<string, number>([['Sheet1', 0], ["Bob's Data", 42]]);
+
+  describe('columnToIndex', () => {
+    it('should convert column letters to zero-based indexes', () => {
+      expect(columnToIndex('A')).toBe(0);
+      expect(columnToIndex('z')).toBe(25);
+      expect(columnToIndex('AA')).toBe(26);
+    });
+  });
+
+  describe('parseA1Range', () => {
+    it('should resolve a bounded range on a named sheet', () => {
+      expect(parseA1Range('Sheet1!A1:B10', sheetIds())).toEqual({
+        sheetId: 0, startRowIndex: 0, endRowIndex: 10, startColumnIndex: 0, endColumnIndex: 2
+      });
+    });
+
+    it('should handle quoted titles, whole columns and single cells', () => {
+      expect(parseA1Range("'Bob''s Data'!C:D", sheetIds())).toEqual({ sheetId: 42, startColumnIndex: 2, endColumnIndex: 4 });
+      expect(parseA1Range('B3', sheetIds(), 0)).toEqual({
+        sheetId: 0, startRowIndex: 2, endRowIndex: 3, startColumnIndex: 1, endColumnIndex: 2
+      });
+    });
+
+    it('should treat a bare sheet title as the whole sheet', () => {
+      expect(parseA1Range('Sheet1', sheetIds())).toEqual({ sheetId: 0 });
+    });
+
+    it('should accept absolute references', () => {
+      expect(parseA1Range('Sheet1!$A$1:B$2', sheetIds())).toEqual({
+        sheetId: 0, startRowIndex: 0, endRowIndex: 2, startColumnIndex: 0, endColumnIndex: 2
+      });
+    });
+
+    it('should reject unknown sheets and malformed ranges', () => {
+      expect(() => parseA1Range('Nope!A1', sheetIds())).toThrow("Unknown sheet 'Nope'");
+      expect(() => parseA1Range('Sheet1!1A', sheetIds())).toThrow('Invalid A1 range');
+      expect(() => parseA1Range('Sheet1!A0', sheetIds())).toThrow('rows start at 1');
+      expect(() => parseA1Range('Sheet1!A1:B2:C3', sheetIds())).toThrow('Invalid A1 range');
+      expect(() => parseA1Range('Sheet1!A$', sheetIds())).toThrow('Invalid A1 range');
+    });
+
+    it('should reject a lone column or row outside a pair', () => {
+      expect(() => parseA1Range('B', sheetIds(), 0)).toThrow('Invalid A1 range');
+      expect(() => parseA1Range('Sheet1!3', sheetIds())).toThrow('Invalid A1 range');
+      expect(() => parseA1Range('Tab', sheetIds(), 0)).toThrow('Invalid A1 range');
+    });
+  });
+
+  describe('buildSheetOpRequest', () => {
+    it('should let later operations target a sheet added in the same batch', () => {
+      const ids = sheetIds();
+      const addSheet = buildSheetOpRequest({ op: 'addSheet', title: 'Summary' }, ids);
+      const namedRange = buildSheetOpRequest({ op: 'addNamedRange', name: 'totals', range: 'Summary!A1:A5' }, ids);
+      expect(namedRange.addNamedRange?.namedRange?.range?.sheetId).toBe(addSheet.addSheet?.properties?.sheetId);
+    });
+  });
+});
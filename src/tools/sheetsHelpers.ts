@@ -0,0 +1,144 @@
+import { sheets_v4 } from "googleapis";
+
+export type SheetOp =
+    | { op: "addSheet"; title: string; rows?: number; columns?: number }
+    | { op: "addNamedRange"; name: string; range: string }
+    | { op: "addDataValidation"; range: string; condition_type: string; values?: string[]; strict?: boolean; input_message?: string }
+    | { op: "addProtectedRange"; range: string; description?: string; warning_only?: boolean; editors?: string[] };
+
+// Column letters and/or a row number, each optionally anchored with "$".
+const CELL_REF = /^(?:\$?([A-Za-z]+))?(?:\$?(\d+))?$/;
+
+export function columnToIndex(column: string): number {
+    let index = 0;
+    for (const ch of column.toUpperCase()) {
+        index = index * 26 + (ch.charCodeAt(0) - 64);
+    }
+    return index - 1;
+}
+
+function unquoteSheetTitle(title: string): string {
+    if (title.length >= 2 && title.startsWith("'") && title.endsWith("'")) {
+        return title.slice(1, -1).replace(/''/g, "'");
+    }
+    return title;
+}
+
+function parseCellRef(ref: string, range: string, partial: boolean): { column?: number; row?: number } {
+    const match = CELL_REF.exec(ref);
+    // Only one side of a "start:end" pair may omit its row or column (e.g. "A:C", "A2:D").
+    if (!match || (partial ? (!match[1] && !match[2]) : (!match[1] || !match[2]))) {
+        throw new Error(`Invalid A1 range '${range}'.`);
+    }
+    const row = match[2] ? Number(match[2]) : undefined;
+    if (row === 0) throw new Error(`Invalid A1 range '${range}': rows start at 1.`);
+    return {
+        column: match[1] ? columnToIndex(match[1]) : undefined,
+        row: row !== undefined ? row - 1 : undefined
+    };
+}
+
+/**
+ * Resolves an A1 range (e.g. "Sheet1!A1:B10", "'My Sheet'!A:C", "A2:D") to a GridRange.
+ * Ranges without a sheet prefix resolve against defaultSheetId.
+ */
+export function parseA1Range(range: string, sheetIds: Map<string, number>, defaultSheetId?: number): sheets_v4.Schema$GridRange {
+    const bang = range.lastIndexOf("!");
+    let sheetId = defaultSheetId;
+    let cells = range;
+
+    if (bang !== -1) {
+        const title = unquoteSheetTitle(range.slice(0, bang));
+        sheetId = sheetIds.get(title);
+        if (sheetId === undefined) throw new Error(`Unknown sheet '${title}' in range '${range}'.`);
+        cells = range.slice(bang + 1);
+    } else if (sheetIds.has(unquoteSheetTitle(range))) {
+        return { sheetId: sheetIds.get(unquoteSheetTitle(range)) };
+    }
+
+    if (sheetId === undefined) throw new Error(`Cannot resolve a sheet for range '${range}'.`);
+
+    const gridRange: sheets_v4.Schema$GridRange = { sheetId };
+    if (!cells) return gridRange;
+
+    const parts = cells.split(":");
+    if (parts.length > 2) throw new Error(`Invalid A1 range '${range}'.`);
+    const isPair = parts.length === 2;
+    const start = parseCellRef(parts[0], range, isPair);
+    const end = isPair ? parseCellRef(parts[1], range, true) : start;
+
+    if (start.row !== undefined) gridRange.startRowIndex = start.row;
+    if (end.row !== undefined) gridRange.endRowIndex = end.row + 1;
+    if (start.column !== undefined) gridRange.startColumnIndex = start.column;
+    if (end.column !== undefined) gridRange.endColumnIndex = end.column + 1;
+    return gridRange;
+}
+
+function newSheetId(sheetIds: Map<string, number>): number {
+    const used = new Set(sheetIds.values());
+    let id: number;
+    do {
+        id = 1 + Math.floor(Math.random() * 0x7ffffffe);
+    } while (used.has(id));
+    return id;
+}
+
+/**
+ * Builds the batchUpdate request for one operation. addSheet assigns the new sheet's ID
+ * client-side and registers it in sheetIds so later operations in the same batch can target it.
+ */
+export function buildSheetOpRequest(op: SheetOp, sheetIds: Map<string, number>, defaultSheetId?: number): sheets_v4.Schema$Request {
+    switch (op.op) {
+        case "addSheet": {
+            if (sheetIds.has(op.title)) throw new Error(`Sheet '${op.title}' already exists.`);
+            const sheetId = newSheetId(sheetIds);
+            sheetIds.set(op.title, sheetId);
+            const properties: sheets_v4.Schema$SheetProperties = { sheetId, title: op.title };
+            if (op.rows || op.columns) {
+                properties.gridProperties = { rowCount: op.rows, columnCount: op.columns };
+            }
+            return { addSheet: { properties } };
+        }
+        case "addNamedRange":
+            return { addNamedRange: { namedRange: { name: op.name, range: parseA1Range(op.range, sheetIds, defaultSheetId) } } };
+        case "addDataValidation":
+            return {
+                setDataValidation: {
+                    range: parseA1Range(op.range, sheetIds, defaultSheetId),
+                    rule: {
+                        condition: {
+                            type: op.condition_type,
+                            values: op.values?.map(v => ({ userEnteredValue: v }))
+                        },
+                        strict: op.strict ?? true,
+                        showCustomUi: true,
+                        inputMessage: op.input_message
+                    }
+                }
+            };
+        case "addProtectedRange":
+            return {
+                addProtectedRange: {
+                    protectedRange: {
+                        range: parseA1Range(op.range, sheetIds, defaultSheetId),
+                        description: op.description,
+                        warningOnly: op.warning_only ?? false,
+                        editors: op.editors ? { users: op.editors } : undefined
+                    }
+                }
+            };
+    }
+}
+
+export function describeSheetOpReply(op: SheetOp, reply: sheets_v4.Schema$Response | undefined): string {
+    switch (op.op) {
+        case "addSheet":
+            return `Added sheet '${op.title}' (ID: ${reply?.addSheet?.properties?.sheetId})`;
+        case "addNamedRange":
+            return `Added named range '${op.name}' -> ${op.range} (ID: ${reply?.addNamedRange?.namedRange?.namedRangeId})`;
+        case "addDataValidation":
+            return `Set ${op.condition_type} validation on ${op.range}`;
+        case "addProtectedRange":
+            return `Protected ${op.range} (ID: ${reply?.addProtectedRange?.protectedRange?.protectedRangeId})`;
+    }
+}
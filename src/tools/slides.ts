@@ -2,35 +2,158 @@ import { McpServer } from "@modelcontextprotocol/sdk/server/mcp.js";
 import { z } from "zod";
 import { google, slides_v1 } from "googleapis";
 import { credentialStore } from "../auth/credentialStore";
+import { BatchCoalescer } from "../utils/batching";
+import { withBackoff } from "../utils/rateLimit";
+import { randomHex } from "../crypto";
+import { validateEmail } from "../utils/validation";
 
 // Helper Functions
 
+// Object IDs only need to be unique within a presentation: a per-process random prefix
+// plus a counter avoids collisions without drawing fresh randomness for every element.
+const OBJECT_ID_PREFIX = randomHex(3);
+let objectIdCounter = 0;
+
+function nextObjectId(kind: string): string {
+    return `${kind}_${OBJECT_ID_PREFIX}${(objectIdCounter++).toString(16)}`;
+}
+
+interface SlidesEdit {
+    slides: slides_v1.Slides;
+    presentationId: string;
+    requests: slides_v1.Schema$Request[];
+}
+
+// get_presentation results are reused briefly, per user; an edit made through this server
+// by any user evicts every cached copy of that presentation.
+const PRESENTATION_TTL_MS = 60000;
+const PRESENTATION_CACHE_MAX = 100;
+const presentationCache = new Map<string, {
+    presentationId: string;
+    fetchedAt: number;
+    data: slides_v1.Schema$Presentation;
+}>();
+// Bumped per presentation on every eviction so a fetch that overlapped an edit does not
+// re-cache pre-edit data.
+const presentationGenerations = new Map<string, number>();
+
+function presentationKey(userEmail: string, presentationId: string): string {
+    return `${validateEmail(userEmail) ?? userEmail}:${presentationId}`;
+}
+
+function presentationGeneration(presentationId: string): number {
+    return presentationGenerations.get(presentationId) ?? 0;
+}
+
+function evictPresentation(presentationId: string): void {
+    presentationGenerations.set(presentationId, presentationGeneration(presentationId) + 1);
+    for (const [key, entry] of presentationCache) {
+        if (entry.presentationId === presentationId) presentationCache.delete(key);
+    }
+}
+
+function getCachedPresentation(key: string): slides_v1.Schema$Presentation | undefined {
+    const entry = presentationCache.get(key);
+    if (!entry) return undefined;
+    if (Date.now() - entry.fetchedAt >= PRESENTATION_TTL_MS) {
+        presentationCache.delete(key);
+        return undefined;
+    }
+    return entry.data;
+}
+
+function cachePresentation(
+    key: string,
+    presentationId: string,
+    data: slides_v1.Schema$Presentation,
+    generation: number
+): void {
+    if (presentationGeneration(presentationId) !== generation) return;
+    presentationCache.delete(key);
+    presentationCache.set(key, { presentationId, fetchedAt: Date.now(), data });
+    if (presentationCache.size > PRESENTATION_CACHE_MAX) {
+        presentationCache.delete(presentationCache.keys().next().value!);
+    }
+}
+
+// Edits to the same presentation (by the same user) arriving within a few milliseconds
+// share one batchUpdate; each caller gets back the replies for its own requests.
+const slidesEdits = new BatchCoalescer<SlidesEdit, slides_v1.Schema$Response[]>(
+    async (_key, edits) => {
+        const { slides, presentationId } = edits[0];
+        // Edits are not idempotent, so only retry 429s, which are rejected before being applied.
+        // Evict even on failure: a failed batch may still have been applied server-side.
+        const res = await withBackoff(() => slides.presentations.batchUpdate({
+            presentationId,
+            fields: "replies(replaceAllText/occurrencesChanged)",
+            requestBody: { requests: edits.flatMap(e => e.requests) }
+        }), { retryStatuses: [429] }).finally(() => evictPresentation(presentationId));
+        const replies = res.data.replies || [];
+        let offset = 0;
+        return edits.map(e => {
+            const own = replies.slice(offset, offset + e.requests.length);
+            offset += e.requests.length;
+            return own;
+        });
+    },
+    { flushIntervalMs: 5 }
+);
+
+function submitSlidesEdit(userEmail: string, edit: SlidesEdit): Promise<slides_v1.Schema$Response[]> {
+    return slidesEdits.submit(presentationKey(userEmail, edit.presentationId), edit);
+}
+
+function ptSize(width: number, height: number): slides_v1.Schema$Size {
+    return { width: { magnitude: width, unit: "PT" }, height: { magnitude: height, unit: "PT" } };
+}
+
+function ptTransform(x: number, y: number): slides_v1.Schema$AffineTransform {
+    return { scaleX: 1, scaleY: 1, translateX: x, translateY: y, unit: "PT" };
+}
+
+function appendTextRuns(parts: string[], textElements?: slides_v1.Schema$TextElement[] | null): void {
+    for (const te of textElements || []) {
+        const content = te.textRun?.content;
+        if (content) parts.push(content);
+    }
+}
+
 function extractTextFromSlide(slide: slides_v1.Schema$Page): string {
-    let text = "";
-    const elements = slide.pageElements || [];
-
-    elements.forEach(element => {
-        if (element.shape && element.shape.text) {
-            const textElements = element.shape.text.textElements || [];
-            textElements.forEach(te => {
-                if (te.textRun && te.textRun.content) {
-                    text += te.textRun.content;
-                }
-            });
-            text += "\n";
+    // Collect runs into one buffer and join once rather than re-concatenating per element.
+    const parts: string[] = [];
+
+    for (const element of slide.pageElements || []) {
+        if (element.shape?.text) {
+            appendTextRuns(parts, element.shape.text.textElements);
+            parts.push("\n");
         } else if (element.table) {
             // Simple table text extraction
-            element.table.tableRows?.forEach(row => {
-                row.tableCells?.forEach(cell => {
-                    const content = cell.text?.textElements?.map(te => te.textRun?.content).join("") || "";
-                    text += content + "\t";
-                });
-                text += "\n";
-            });
+            for (const row of element.table.tableRows || []) {
+                for (const cell of row.tableCells || []) {
+                    appendTextRuns(parts, cell.text?.textElements);
+                    parts.push("\t");
+                }
+                parts.push("\n");
+            }
         }
-    });
+    }
 
-    return text.trim();
+    return parts.join("").trim();
+}
+
+// Only the fields extractTextFromSlide reads; skips layouts, masters and styling.
+const PRESENTATION_TEXT_FIELDS =
+    "presentationId,title,slides(objectId,pageElements(objectId," +
+    "shape(text(textElements(textRun(content))))," +
+    "table(tableRows(tableCells(text(textElements(textRun(content))))))))";
+
+function formatSlide(slide: slides_v1.Schema$Page, index: number, withText: boolean): string {
+    const header = `Slide ${index + 1} (ID: ${slide.objectId})`;
+    if (!withText) {
+        return `${header}: ${slide.pageElements?.length || 0} element(s), text: [truncated]\n---\n`;
+    }
+    const text = extractTextFromSlide(slide);
+    return `${header}:\n${text ? text : '[No Text]'}\n---\n`;
 }
 
 export function registerSlidesTools(server: McpServer) {
@@ -65,23 +188,29 @@ export function registerSlidesTools(server: McpServer) {
         "Gets details about a presentation.",
         {
             user_google_email: z.string().describe("The user's Google email address. Required."),
-            presentation_id: z.string().describe("The ID of the presentation.")
+            presentation_id: z.string().describe("The ID of the presentation."),
+            max_slides_detail: z.number().default(50).describe("Extract text for at most this many slides; later slides are summarized.")
         },
-        async ({ user_google_email, presentation_id }) => {
+        async ({ user_google_email, presentation_id, max_slides_detail }) => {
             const auth = await credentialStore.getCredential(user_google_email);
             if (!auth) return { content: [{ type: "text", text: `Authorization required` }], isError: true };
 
             try {
-                const slides = google.slides({ version: "v1", auth });
-                const res = await slides.presentations.get({ presentationId: presentation_id });
-                const pres = res.data;
-
-                let output = `Presentation: "${pres.title}" (ID: ${pres.presentationId})\nSlides: ${pres.slides?.length || 0}\n\n`;
+                const cacheKey = presentationKey(user_google_email, presentation_id);
+                let pres = getCachedPresentation(cacheKey);
+                if (!pres) {
+                    const generation = presentationGeneration(presentation_id);
+                    const slides = google.slides({ version: "v1", auth });
+                    const res = await slides.presentations.get({
+                        presentationId: presentation_id,
+                        fields: PRESENTATION_TEXT_FIELDS
+                    });
+                    pres = res.data;
+                    cachePresentation(cacheKey, presentation_id, pres, generation);
+                }
 
-                pres.slides?.forEach((slide, i) => {
-                    const text = extractTextFromSlide(slide);
-                    output += `Slide ${i + 1} (ID: ${slide.objectId}):\n${text ? text : '[No Text]'}\n---\n`;
-                });
+                const slideList = pres.slides || [];
+                const output = `Presentation: "${pres.title}" (ID: ${pres.presentationId})\nSlides: ${slideList.length}\n\n${slideList.map((slide, i) => formatSlide(slide, i, i < max_slides_detail)).join("")}`;
 
                 return { content: [{ type: "text", text: output }] };
 
@@ -106,8 +235,10 @@ export function registerSlidesTools(server: McpServer) {
 
             try {
                 const slides = google.slides({ version: "v1", auth });
+                const slideId = nextObjectId("slide");
                 const req: slides_v1.Schema$Request = {
                     createSlide: {
+                        objectId: slideId,
                         slideLayoutReference: { predefinedLayout: layout }
                     }
                 };
@@ -115,12 +246,12 @@ export function registerSlidesTools(server: McpServer) {
                     req.createSlide.insertionIndex = insertion_index;
                 }
 
-                const res = await slides.presentations.batchUpdate({
+                await submitSlidesEdit(user_google_email, {
+                    slides,
                     presentationId: presentation_id,
-                    requestBody: { requests: [req] }
+                    requests: [req]
                 });
 
-                const slideId = res.data.replies?.[0].createSlide?.objectId;
                 return { content: [{ type: "text", text: `Created slide (ID: ${slideId})` }] };
             } catch (err: any) {
                 return { content: [{ type: "text", text: `Error creating slide: ${err.message}` }], isError: true };
@@ -147,7 +278,7 @@ export function registerSlidesTools(server: McpServer) {
 
             try {
                 const slides = google.slides({ version: "v1", auth });
-                const elementId = `textbox_${Math.random().toString(36).substring(7)}`;
+                const elementId = nextObjectId("textbox");
 
                 const requests: slides_v1.Schema$Request[] = [
                     {
@@ -156,8 +287,8 @@ export function registerSlidesTools(server: McpServer) {
                             shapeType: "TEXT_BOX",
                             elementProperties: {
                                 pageObjectId: page_id,
-                                size: { width: { magnitude: width, unit: "PT" }, height: { magnitude: height, unit: "PT" } },
-                                transform: { scaleX: 1, scaleY: 1, translateX: x, translateY: y, unit: "PT" }
+                                size: ptSize(width, height),
+                                transform: ptTransform(x, y)
                             }
                         }
                     },
@@ -169,10 +300,7 @@ export function registerSlidesTools(server: McpServer) {
                     }
                 ];
 
-                await slides.presentations.batchUpdate({
-                    presentationId: presentation_id,
-                    requestBody: { requests }
-                });
+                await submitSlidesEdit(user_google_email, { slides, presentationId: presentation_id, requests });
 
                 return { content: [{ type: "text", text: `Added textbox (ID: ${elementId})` }] };
             } catch (err: any) {
@@ -180,4 +308,44 @@ export function registerSlidesTools(server: McpServer) {
             }
         }
     );
+
+    server.tool(
+        "replace_text_everywhere",
+        "Replaces text across every slide of a presentation. Accepts many find/replace pairs and applies them in one request.",
+        {
+            user_google_email: z.string(),
+            presentation_id: z.string(),
+            replacements: z.array(z.object({
+                find: z.string().min(1),
+                replace: z.string()
+            })).min(1).describe("Find/replace pairs, applied in order."),
+            match_case: z.boolean().default(true)
+        },
+        async ({ user_google_email, presentation_id, replacements, match_case }) => {
+            const auth = await credentialStore.getCredential(user_google_email);
+            if (!auth) return { content: [{ type: "text", text: `Authorization required` }], isError: true };
+
+            try {
+                const slides = google.slides({ version: "v1", auth });
+
+                const requests: slides_v1.Schema$Request[] = replacements.map(({ find, replace }) => ({
+                    replaceAllText: {
+                        containsText: { text: find, matchCase: match_case },
+                        replaceText: replace
+                    }
+                }));
+
+                const replies = await submitSlidesEdit(user_google_email, { slides, presentationId: presentation_id, requests });
+
+                const lines = replacements.map(({ find, replace }, i) =>
+                    `- '${find}' -> '${replace}': ${replies[i]?.replaceAllText?.occurrencesChanged || 0} occurrence(s)`
+                );
+                const output = `Replaced text in presentation ${presentation_id}:\n${lines.join("\n")}`;
+
+                return { content: [{ type: "text", text: output }] };
+            } catch (err: any) {
+                return { content: [{ type: "text", text: `Error replacing text: ${err.message}` }], isError: true };
+            }
+        }
+    );
 }
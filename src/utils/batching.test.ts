@@ -0,0 +1,65 @@
+import { describe, it, expect } from 'vitest';
+import { BatchCoalescer } from './batching';
+
+const httpError = (status: number) => Object.assign(new Error(`HTTP ${status}`), { response: { status } });
+
+describe('BatchCoalescer', () => {
+  it('should coalesce concurrent submissions for the same key into one call', async () => {
+    const calls: number[][] = [];
+    const coalescer = new BatchCoalescer<number, number>(async (_key, items) => {
+      calls.push(items);
+      return items.map(n => n * 2);
+    }, { flushIntervalMs: 5 });
+
+    const results = await Promise.all([1, 2, 3].map(n => coalescer.submit('a', n)));
+    expect(results).toEqual([2, 4, 6]);
+    expect(calls).toEqual([[1, 2, 3]]);
+  });
+
+  it('should keep different keys in separate batches', async () => {
+    const calls: string[] = [];
+    const coalescer = new BatchCoalescer<number, number>(async (key, items) => {
+      calls.push(key);
+      return items;
+    }, { flushIntervalMs: 5 });
+
+    await Promise.all([coalescer.submit('a', 1), coalescer.submit('b', 2)]);
+    expect(calls.sort()).toEqual(['a', 'b']);
+  });
+
+  it('should flush immediately once maxBatch is reached', async () => {
+    const sizes: number[] = [];
+    const coalescer = new BatchCoalescer<number, number>(async (_key, items) => {
+      sizes.push(items.length);
+      return items;
+    }, { flushIntervalMs: 1000, maxBatch: 2 });
+
+    await Promise.all([coalescer.submit('a', 1), coalescer.submit('a', 2)]);
+    expect(sizes).toEqual([2]);
+  });
+
+  it('should replay an invalid batch one item at a time in submission order', async () => {
+    const replayed: number[] = [];
+    const coalescer = new BatchCoalescer<number, number>(async (_key, items) => {
+      if (items.includes(-1)) throw httpError(400);
+      if (items.length === 1) replayed.push(items[0]);
+      return items;
+    }, { flushIntervalMs: 5 });
+
+    const results = await Promise.allSettled([1, -1, 3].map(n => coalescer.submit('a', n)));
+    expect(results.map(r => r.status)).toEqual(['fulfilled', 'rejected', 'fulfilled']);
+    expect(replayed).toEqual([1, 3]);
+  });
+
+  it.each([429, 503])('should reject every item without replaying on %i', async status => {
+    let calls = 0;
+    const coalescer = new BatchCoalescer<number, number>(async () => {
+      calls++;
+      throw httpError(status);
+    }, { flushIntervalMs: 5 });
+
+    const results = await Promise.allSettled([1, 2, 3].map(n => coalescer.submit('a', n)));
+    expect(results.map(r => r.status)).toEqual(['rejected', 'rejected', 'rejected']);
+    expect(calls).toBe(1);
+  });
+});
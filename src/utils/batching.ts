@@ -0,0 +1,80 @@
+import { getErrorStatus } from './rateLimit';
+
+export interface BatchCoalescerOptions {
+  flushIntervalMs?: number;
+  maxBatch?: number;
+}
+
+interface PendingItem<TItem, TResult> {
+  item: TItem;
+  resolve: (result: TResult) => void;
+  reject: (err: unknown) => void;
+}
+
+/**
+ * Coalesces items submitted under the same key within a short window into a single batch call.
+ * The executor must return one result per item, in submission order. A batch rejected as
+ * invalid (HTTP 400) is replayed item by item so only the offending caller fails; any other
+ * error is passed to every caller unchanged.
+ */
+export class BatchCoalescer<TItem, TResult> {
+  private queues = new Map<string, PendingItem<TItem, TResult>[]>();
+  private timers = new Map<string, NodeJS.Timeout>();
+  private readonly flushIntervalMs: number;
+  private readonly maxBatch: number;
+
+  constructor(
+    private readonly execute: (key: string, items: TItem[]) => Promise<TResult[]>,
+    options: BatchCoalescerOptions = {}
+  ) {
+    this.flushIntervalMs = options.flushIntervalMs ?? 20;
+    this.maxBatch = options.maxBatch ?? 100;
+  }
+
+  submit(key: string, item: TItem): Promise<TResult> {
+    return new Promise<TResult>((resolve, reject) => {
+      const queue = this.queues.get(key) || [];
+      queue.push({ item, resolve, reject });
+      this.queues.set(key, queue);
+
+      if (queue.length >= this.maxBatch) {
+        this.flush(key);
+      } else if (!this.timers.has(key)) {
+        this.timers.set(key, setTimeout(() => this.flush(key), this.flushIntervalMs));
+      }
+    });
+  }
+
+  private flush(key: string): void {
+    const timer = this.timers.get(key);
+    if (timer) clearTimeout(timer);
+    this.timers.delete(key);
+
+    const pending = this.queues.get(key);
+    this.queues.delete(key);
+    if (pending?.length) void this.dispatch(key, pending);
+  }
+
+  private async dispatch(key: string, pending: PendingItem<TItem, TResult>[]): Promise<void> {
+    try {
+      const results = await this.execute(key, pending.map(p => p.item));
+      pending.forEach((p, i) => p.resolve(results[i]));
+    } catch (err) {
+      // Anything other than a validation failure may already have been applied upstream or
+      // be quota-related, so replaying it would duplicate writes or amplify retries.
+      if (pending.length === 1 || getErrorStatus(err) !== 400) {
+        for (const p of pending) p.reject(err);
+        return;
+      }
+      // Replay one at a time, in submission order, so writes for the same key keep their order.
+      for (const p of pending) {
+        try {
+          const [result] = await this.execute(key, [p.item]);
+          p.resolve(result);
+        } catch (itemErr) {
+          p.reject(itemErr);
+        }
+      }
+    }
+  }
+}
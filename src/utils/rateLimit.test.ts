@@ -0,0 +1,87 @@
+import { describe, it, expect, vi, beforeEach, afterEach } from 'vitest';
+import { withBackoff, KeyedSemaphore, TokenBucket, getErrorStatus } from './rateLimit';
+
+const httpError = (status: number) => Object.assign(new Error(`HTTP ${status}`), { response: { status } });
+
+describe('rateLimit', () => {
+  describe('getErrorStatus', () => {
+    it('should read the status from gaxios-style errors', () => {
+      expect(getErrorStatus(httpError(429))).toBe(429);
+      expect(getErrorStatus({ code: 503 })).toBe(503);
+      expect(getErrorStatus({ code: 'ECONNRESET' })).toBeUndefined();
+    });
+  });
+
+  describe('withBackoff', () => {
+    it('should retry retryable statuses until success', async () => {
+      let calls = 0;
+      const result = await withBackoff(async () => {
+        calls++;
+        if (calls < 3) throw httpError(429);
+        return 'ok';
+      }, { initialDelayMs: 1 });
+      expect(result).toBe('ok');
+      expect(calls).toBe(3);
+    });
+
+    it('should not retry other errors', async () => {
+      let calls = 0;
+      await expect(withBackoff(async () => {
+        calls++;
+        throw httpError(400);
+      }, { initialDelayMs: 1 })).rejects.toThrow('HTTP 400');
+      expect(calls).toBe(1);
+    });
+
+    it('should give up after the configured retries', async () => {
+      let calls = 0;
+      await expect(withBackoff(async () => {
+        calls++;
+        throw httpError(503);
+      }, { retries: 2, initialDelayMs: 1 })).rejects.toThrow('HTTP 503');
+      expect(calls).toBe(3);
+    });
+  });
+
+  describe('KeyedSemaphore', () => {
+    it('should cap concurrency per key', async () => {
+      const semaphore = new KeyedSemaphore(2);
+      let active = 0;
+      let peak = 0;
+      const task = () => semaphore.run('sheet', async () => {
+        active++;
+        peak = Math.max(peak, active);
+        await new Promise(resolve => setTimeout(resolve, 5));
+        active--;
+      });
+      await Promise.all([task(), task(), task(), task(), task()]);
+      expect(peak).toBe(2);
+    });
+  });
+
+  describe('TokenBucket', () => {
+    beforeEach(() => {
+      vi.useFakeTimers();
+    });
+
+    afterEach(() => {
+      vi.useRealTimers();
+    });
+
+    it('should grant the burst immediately and then pace callers', async () => {
+      const bucket = new TokenBucket(2, 40);
+      await Promise.all([bucket.acquire(), bucket.acquire()]);
+
+      let granted = false;
+      const third = bucket.acquire().then(() => {
+        granted = true;
+      });
+      await vi.advanceTimersByTimeAsync(19);
+      expect(granted).toBe(false);
+
+      await vi.advanceTimersByTimeAsync(1);
+      await third;
+      expect(granted).toBe(true);
+    });
+  });
+});
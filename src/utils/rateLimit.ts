@@ -0,0 +1,133 @@
+export interface BackoffOptions {
+  retries?: number;
+  initialDelayMs?: number;
+  maxDelayMs?: number;
+  retryStatuses?: number[];
+}
+
+const sleep = (ms: number) => new Promise<void>(resolve => setTimeout(resolve, ms));
+
+/**
+ * Extracts the HTTP status from a googleapis/gaxios error, if any
+ * @param err - The thrown error
+ * @returns The numeric status or undefined
+ */
+export function getErrorStatus(err: any): number | undefined {
+  const status = err?.response?.status ?? err?.status ?? err?.code;
+  return typeof status === 'number' ? status : undefined;
+}
+
+/**
+ * Runs a request, retrying quota/availability failures with exponential backoff and full jitter
+ * @param fn - Function issuing the request
+ * @param options - Retry tuning; defaults retry 429/503 up to 5 times between 200ms and 30s
+ * @returns The request result
+ */
+export async function withBackoff<T>(fn: () => Promise<T>, options: BackoffOptions = {}): Promise<T> {
+  const {
+    retries = 5,
+    initialDelayMs = 200,
+    maxDelayMs = 30000,
+    retryStatuses = [429, 503]
+  } = options;
+
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await fn();
+    } catch (err) {
+      const status = getErrorStatus(err);
+      if (attempt >= retries || status === undefined || !retryStatuses.includes(status)) {
+        throw err;
+      }
+      const ceiling = Math.min(maxDelayMs, initialDelayMs * 2 ** attempt);
+      await sleep(Math.random() * ceiling);
+    }
+  }
+}
+
+/**
+ * Caps the number of in-flight operations per key (e.g. per spreadsheet)
+ */
+export class KeyedSemaphore {
+  private active = new Map<string, number>();
+  private waiters = new Map<string, Array<() => void>>();
+
+  constructor(private readonly limit: number) {}
+
+  async run<T>(key: string, fn: () => Promise<T>): Promise<T> {
+    await this.acquire(key);
+    try {
+      return await fn();
+    } finally {
+      this.release(key);
+    }
+  }
+
+  private acquire(key: string): Promise<void> {
+    const count = this.active.get(key) || 0;
+    if (count < this.limit) {
+      this.active.set(key, count + 1);
+      return Promise.resolve();
+    }
+    return new Promise(resolve => {
+      const queue = this.waiters.get(key) || [];
+      queue.push(resolve);
+      this.waiters.set(key, queue);
+    });
+  }
+
+  private release(key: string): void {
+    const queue = this.waiters.get(key);
+    const next = queue?.shift();
+    if (next) {
+      // Hand the slot straight to the next waiter; the active count is unchanged.
+      if (queue!.length === 0) this.waiters.delete(key);
+      next();
+      return;
+    }
+    const count = (this.active.get(key) || 1) - 1;
+    if (count > 0) this.active.set(key, count);
+    else this.active.delete(key);
+  }
+}
+
+/**
+ * Token bucket that queues callers instead of failing once the budget is spent
+ */
+export class TokenBucket {
+  private tokens: number;
+  private updatedAt = Date.now();
+  private queue: Promise<void> = Promise.resolve();
+
+  /**
+   * @param capacity - Tokens available per window (also the burst size)
+   * @param windowMs - Window length over which capacity refills
+   */
+  constructor(private readonly capacity: number, private readonly windowMs: number) {
+    this.tokens = capacity;
+  }
+
+  acquire(): Promise<void> {
+    // Chain waiters so tokens are handed out in arrival order.
+    const turn = this.queue.then(() => this.take());
+    this.queue = turn;
+    return turn;
+  }
+
+  private async take(): Promise<void> {
+    for (;;) {
+      this.refill();
+      if (this.tokens >= 1) {
+        this.tokens -= 1;
+        return;
+      }
+      await sleep(((1 - this.tokens) * this.windowMs) / this.capacity);
+    }
+  }
+
+  private refill(): void {
+    const now = Date.now();
+    this.tokens = Math.min(this.capacity, this.tokens + ((now - this.updatedAt) * this.capacity) / this.windowMs);
+    this.updatedAt = now;
+  }
+}